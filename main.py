@@ -4,34 +4,40 @@ Adapted for Railway deployment (server-ready).
 """
 
 import asyncio
-import json
 import os
 import logging
 import pytz
 import re
+from collections import deque
+from itertools import islice
 from datetime import datetime, date
 from PIL import Image  # ✅ para redimensionar imágenes grandes
 
 from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove
 from telegram.constants import ChatAction
+from telegram.error import RetryAfter
 from telegram.ext import (
     Application, ApplicationBuilder, CommandHandler, MessageHandler, filters,
     ConversationHandler, ContextTypes
 )
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.interval import IntervalTrigger
+from apscheduler.triggers.cron import CronTrigger
+import aiosqlite
 import httpx
+import msgspec
 
 # -------------------- Config --------------------
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN") or "8238105603:AAGBIEiWVZD7EfSN8KN06FebIxsf1qD6apk"
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY") or "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"
 
 DATA_DIR = "data"
-USERS_FILE = os.path.join(DATA_DIR, "users.json")
+USERS_FILE = os.path.join(DATA_DIR, "users.json")  # formato antiguo, solo para migrar
+DB_FILE = os.path.join(DATA_DIR, "users.db")
 LOG_LEVEL = logging.INFO
 LOCAL_TZ = pytz.timezone("America/Lima")
 TIMESLOT_HOUR = {"mañana": 8, "manana": 8, "tarde": 15, "noche": 21}
 REGISTER_NAME, REGISTER_TIME, REGISTER_PERSONALITY = range(3)
+TEXT_FILTER = filters.TEXT & ~filters.COMMAND
 
 logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s: %(message)s")
 logger = logging.getLogger(__name__)
@@ -39,72 +45,223 @@ logger = logging.getLogger(__name__)
 # -------------------- Helpers --------------------
 if not os.path.exists(DATA_DIR):
     os.makedirs(DATA_DIR)
-if not os.path.exists(USERS_FILE):
-    with open(USERS_FILE, "w", encoding="utf-8") as f:
-        json.dump({}, f)
 
-async def load_users():
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(None, _load_users_sync)
+USERS_FLUSH_INTERVAL = 2  # segundos entre volcados a disco
+HISTORY_MAXLEN = 30  # mensajes guardados por usuario
+
+class UserRec(msgspec.Struct):
+    name: str | None = None
+    time: str | None = None
+    personality: str | None = "Wuen"  # None (NULL o JSON antiguo) se normaliza a "Wuen"
+    last_topic: str | None = None
+    last_sent_date: str | None = None
+    last_sent_time: str | None = None
+    last_message_date: str | None = None
+    history: list = []
+
+    def __post_init__(self):
+        if self.personality is None:
+            self.personality = "Wuen"
+        self.history = deque(self.history, maxlen=HISTORY_MAXLEN)
+
+USER_FIELDS = tuple(f for f in UserRec.__struct_fields__ if f != "history")
+_history_enc = msgspec.json.Encoder(enc_hook=list)  # deque -> list
+_history_dec = msgspec.json.Decoder(list)
+_legacy_users_dec = msgspec.json.Decoder(dict[str, UserRec])
+
+# Usuarios en memoria: se cargan una vez al inicio desde SQLite y solo se
+# escriben en segundo plano las filas de los usuarios modificados.
+USERS: dict = {}
+# Índice inverso hora -> uids, para que el scheduler solo toque a los candidatos.
+TIMESLOT_INDEX: dict = {}
+_dirty_uids: set = set()
+_users_flush_lock = asyncio.Lock()
+_db = None
+
+_CREATE_USERS_SQL = (
+    "CREATE TABLE IF NOT EXISTS users ("
+    "uid TEXT PRIMARY KEY, name TEXT, time TEXT, personality TEXT, last_topic TEXT, "
+    "last_sent_date TEXT, last_sent_time TEXT, last_message_date TEXT, history BLOB)"
+)
+_UPSERT_USER_SQL = (
+    f"INSERT OR REPLACE INTO users (uid, {', '.join(USER_FIELDS)}, history) "
+    f"VALUES ({', '.join('?' * (len(USER_FIELDS) + 2))})"
+)
+
+def _user_to_row(uid: str, user: UserRec):
+    return (uid, *(getattr(user, k) for k in USER_FIELDS), _history_enc.encode(user.history))
+
+def _row_to_user(row) -> UserRec:
+    return UserRec(*row[1:-1], history=_history_dec.decode(row[-1]) if row[-1] else [])
 
-def _load_users_sync():
-    with open(USERS_FILE, "r", encoding="utf-8") as f:
+def _load_legacy_users_sync():
+    with open(USERS_FILE, "rb") as f:
         try:
-            return json.load(f)
-        except json.JSONDecodeError:
+            return _legacy_users_dec.decode(f.read())
+        except msgspec.DecodeError as e:
+            logger.warning("No se pudo leer %s: %s", USERS_FILE, e)
             return {}
 
-async def save_users(users: dict):
-    loop = asyncio.get_event_loop()
-    await loop.run_in_executor(None, _save_users_sync, users)
-
-def _save_users_sync(users: dict):
-    with open(USERS_FILE, "w", encoding="utf-8") as f:
-        json.dump(users, f, ensure_ascii=False, indent=2)
+async def _migrate_legacy_users():
+    """Importa data/users.json la primera vez que se arranca con SQLite."""
+    async with _db.execute("SELECT COUNT(*) FROM users") as cur:
+        (count,) = await cur.fetchone()
+    if count or not os.path.exists(USERS_FILE):
+        return
+    legacy = await asyncio.to_thread(_load_legacy_users_sync)
+    await _db.executemany(_UPSERT_USER_SQL, [_user_to_row(uid, u) for uid, u in legacy.items()])
+    await _db.commit()
+    logger.info("Migrados %d usuarios desde %s", len(legacy), USERS_FILE)
+
+async def init_db():
+    global _db
+    _db = await aiosqlite.connect(DB_FILE)
+    await _db.execute("PRAGMA journal_mode=WAL")
+    await _db.execute(_CREATE_USERS_SQL)
+    await _db.commit()
+    await _migrate_legacy_users()
+    async with _db.execute(f"SELECT uid, {', '.join(USER_FIELDS)}, history FROM users") as cur:
+        async for row in cur:
+            USERS[row[0]] = _row_to_user(row)
+    rebuild_timeslot_index()
+
+async def close_db():
+    global _db
+    if _db is not None:
+        await _db.close()
+        _db = None
+
+def _index_timeslot(uid: str, old_time, new_time):
+    old_hour, new_hour = TIMESLOT_HOUR.get(old_time), TIMESLOT_HOUR.get(new_time)
+    if old_hour == new_hour:
+        return
+    if old_hour is not None:
+        TIMESLOT_INDEX.get(old_hour, set()).discard(uid)
+    if new_hour is not None:
+        TIMESLOT_INDEX.setdefault(new_hour, set()).add(uid)
+
+def rebuild_timeslot_index():
+    TIMESLOT_INDEX.clear()
+    for uid, user in USERS.items():
+        _index_timeslot(uid, None, user.time)
+
+def get_user(uid: str):
+    return USERS.get(uid)
+
+def upsert_user(uid: str, fields: dict):
+    old = USERS.get(uid)
+    user = USERS[uid] = UserRec(**{**(msgspec.structs.asdict(old) if old else {}), **fields})
+    _index_timeslot(uid, old.time if old else None, user.time)
+    mark_dirty(uid)
+    return USERS[uid]
+
+def mark_dirty(uid: str):
+    _dirty_uids.add(uid)
+
+async def flush_users():
+    async with _users_flush_lock:
+        if not _dirty_uids or _db is None:
+            return
+        uids = list(_dirty_uids)
+        _dirty_uids.clear()
+        # Las filas se arman en el hilo del loop para obtener una copia consistente.
+        rows = [_user_to_row(uid, USERS[uid]) for uid in uids if uid in USERS]
+        try:
+            await _db.executemany(_UPSERT_USER_SQL, rows)
+            await _db.commit()
+        except Exception as e:
+            _dirty_uids.update(uids)
+            logger.exception("Error guardando usuarios: %s", e)
+        except BaseException:
+            # Cancelación a mitad del volcado: se reintenta en el volcado final.
+            _dirty_uids.update(uids)
+            raise
+
+async def users_flush_loop():
+    while True:
+        await asyncio.sleep(USERS_FLUSH_INTERVAL)
+        await flush_users()
 
 # -------------------- OpenRouter Integration --------------------
 PROXY_URL = "https://proxy-openrouter-kappa.vercel.app/"
+SHORT_REPLY_MAX_TOKENS = 160  # saludos y seguimientos programados
+
+# Cliente HTTP compartido (keep-alive); se crea en post_init y se cierra en post_shutdown.
+OPENROUTER_CLIENT = None
+
+def create_openrouter_client():
+    return httpx.AsyncClient(
+        timeout=30.0,
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=50),
+        headers={"Content-Type": "application/json"},
+    )
 
-async def openrouter_chat(user_id: str, user_message: str, personality: str, last_topic: str = None, history: list = None):
-    system_prompt = (
+SYSTEM_PROMPTS = {
+    "p": {"role": "system", "content": (
         "Eres Peter, un asistente educativo y emocional masculino. "
         "Eres calmado, reflexivo y racional, pero empático. "
         "Usas un lenguaje sereno, motivador y lógico."
-        if personality.lower().startswith("p") else
+    )},
+    "w": {"role": "system", "content": (
         "Eres Wuen, una asistente emocional y educativa femenina. "
         "Eres cálida, comprensiva y cercana. Hablas con ternura y empatía, "
         "ayudando a las personas a sentirse escuchadas y guiadas."
-    )
-
-    messages = [{"role": "system", "content": system_prompt}]
-    if last_topic:
+    )},
+}
+
+def _extract_content(data: dict):
+    content = None
+    if "choices" in data and len(data["choices"]) > 0:
+        choice = data["choices"][0]
+        if "message" in choice and "content" in choice["message"]:
+            content = choice["message"]["content"]
+        elif "delta" in choice:
+            content = choice["delta"].get("content")
+        elif "text" in choice:
+            content = choice["text"]
+    return content
+
+async def openrouter_chat(user_id: str, user_message: str, personality: str, last_topic: str = None, history: deque = None, max_tokens: int = 512, on_stream_start=None):
+    messages = [SYSTEM_PROMPTS["p" if personality.lower().startswith("p") else "w"]]
+    # El tema se omite cuando solo repite el mensaje actual del usuario.
+    if last_topic and not user_message.startswith(last_topic):
         messages.append({"role": "system", "content": f"Último tema del usuario: {last_topic}"})
     if history:
-        messages.extend(history[-8:])
+        messages += islice(history, max(len(history) - 8, 0), None)
     messages.append({"role": "user", "content": user_message})
 
-    headers = {"Content-Type": "application/json"}
     payload = {
         "model": "gpt-4o-mini",
         "messages": messages,
-        "max_tokens": 512,
-        "temperature": 0.8
+        "max_tokens": max_tokens,
+        "temperature": 0.8,
+        "stream": True
     }
 
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            resp = await client.post(PROXY_URL, json=payload, headers=headers)
+        async with OPENROUTER_CLIENT.stream("POST", PROXY_URL, json=payload) as resp:
             resp.raise_for_status()
-            data = resp.json()
-
-            content = None
-            if "choices" in data and len(data["choices"]) > 0:
-                choice = data["choices"][0]
-                if "message" in choice and "content" in choice["message"]:
-                    content = choice["message"]["content"]
-                elif "text" in choice:
-                    content = choice["text"]
-            return content.strip() if content else "🌿 Estoy aquí contigo, pero no entendí bien el mensaje."
+            if on_stream_start:
+                # Un fallo del indicador de "escribiendo" no debe perder la respuesta.
+                try:
+                    await on_stream_start()
+                except Exception as e:
+                    logger.warning("Error en on_stream_start: %s", e)
+
+            if not resp.headers.get("content-type", "").startswith("text/event-stream"):
+                # El proxy puede ignorar "stream" y responder con el JSON completo.
+                content = _extract_content(msgspec.json.decode(await resp.aread()))
+            else:
+                parts = []
+                async for line in resp.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    chunk = line[5:].strip()
+                    if chunk == "[DONE]":
+                        break
+                    parts.append(_extract_content(msgspec.json.decode(chunk)) or "")
+                content = "".join(parts)
+        return content.strip() if content else "🌿 Estoy aquí contigo, pero no entendí bien el mensaje."
     except Exception as e:
         logger.exception("Error llamando al proxy: %s", e)
         return "💭 Lo siento, no puedo conectarme con el servicio de IA ahora mismo."
@@ -121,10 +278,10 @@ async def typing_action(func, update, context, *args, **kwargs):
 # -------------------- Start --------------------
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     uid = str(update.effective_user.id)
-    users = await load_users()
 
-    if uid in users:
-        name = users[uid].get("name", "amigx")
+    user = get_user(uid)
+    if user:
+        name = user.name or "amigx"
         await update.message.reply_text(f"🌸 Ya estás registrado, {name}.\nSi quieres ver tu perfil, usa /perfil 🌿")
         return ConversationHandler.END
 
@@ -193,18 +350,16 @@ async def register_personality(update: Update, context: ContextTypes.DEFAULT_TYP
         return REGISTER_PERSONALITY
 
     context.user_data["personality"] = personality
-    users = await load_users()
     uid = str(update.effective_user.id)
 
-    users[uid] = {
+    upsert_user(uid, {
         "name": context.user_data["name"],
         "time": context.user_data["time"],
         "personality": personality,
         "last_topic": None,
         "history": [],
         "last_sent_date": None
-    }
-    await save_users(users)
+    })
 
     await typing_action(lambda u, c: u.message.reply_text(
         f"Perfecto, {context.user_data['name']} 🌷 Ya estás registrado con la personalidad {personality}.",
@@ -212,7 +367,7 @@ async def register_personality(update: Update, context: ContextTypes.DEFAULT_TYP
     ), update, context)
 
     greeting = "Hola 🌿 Me alegra conocerte. ¿Quieres contarme cómo te sientes hoy?"
-    reply = await openrouter_chat(uid, greeting, personality)
+    reply = await openrouter_chat(uid, greeting, personality, max_tokens=SHORT_REPLY_MAX_TOKENS)
     await update.message.reply_text(reply)
     return ConversationHandler.END
 
@@ -220,43 +375,39 @@ async def register_personality(update: Update, context: ContextTypes.DEFAULT_TYP
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = update.message.text.strip()
     uid = str(update.effective_user.id)
-    users = await load_users()
-    if uid not in users:
+    user = get_user(uid)
+    if not user:
         await update.message.reply_text("Aún no estás registrado. Envía /start para registrarte 🌱")
         return
 
-    user = users[uid]
-    personality = user.get("personality", "Wuen")
-    history = user.get("history", [])
-    history.append({"role": "user", "content": text})
     last_topic = text[:100]
-    user["last_topic"] = last_topic
-    user["history"] = history[-30:]
-    await save_users(users)
 
     await context.bot.send_chat_action(chat_id=update.effective_message.chat_id, action=ChatAction.TYPING)
     await asyncio.sleep(1.2)
 
-    reply = await openrouter_chat(uid, text, personality, last_topic, history)
-    users = await load_users()
-    users[uid]["history"].append({"role": "assistant", "content": reply})
-    users[uid]["history"] = users[uid]["history"][-30:]
-    await save_users(users)
+    reply = await openrouter_chat(
+        uid, text, user.personality, last_topic, user.history,
+        on_stream_start=lambda: context.bot.send_chat_action(chat_id=update.effective_message.chat_id, action=ChatAction.TYPING),
+    )
+    user.history.append({"role": "user", "content": text})
+    user.history.append({"role": "assistant", "content": reply})
+    user.last_topic = last_topic
+    user.last_message_date = date.today().isoformat()
+    mark_dirty(uid)
     await update.message.reply_text(reply)
 
 # -------------------- Perfil y ayuda --------------------
 async def perfil(update: Update, context: ContextTypes.DEFAULT_TYPE):
     uid = str(update.effective_user.id)
-    users = await load_users()
-    if uid not in users:
+    u = get_user(uid)
+    if not u:
         await update.message.reply_text("No estás registrado. Usa /start para registrarte.")
         return
-    u = users[uid]
     msg = (
-        f"Nombre: {u.get('name')}\n"
-        f"Personalidad: {u.get('personality')}\n"
-        f"Horario: {u.get('time')}\n"
-        f"Último tema: {u.get('last_topic')}\n"
+        f"Nombre: {u.name}\n"
+        f"Personalidad: {u.personality}\n"
+        f"Horario: {u.time}\n"
+        f"Último tema: {u.last_topic}\n"
     )
     await update.message.reply_text(msg)
 
@@ -271,65 +422,153 @@ async def ayuda(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(txt)
 
 # -------------------- Scheduler --------------------
-async def send_followups(application: Application):
-    users = await load_users()
-    now = datetime.now(LOCAL_TZ)
-    current_hour = now.hour
-    today_str = date.today().isoformat()
-    for uid, info in users.items():
-        timeslot = info.get("time")
-        if not timeslot:
-            continue
-        target_hour = TIMESLOT_HOUR.get(timeslot)
-        if current_hour != target_hour or info.get("last_sent_date") == today_str:
-            continue
-        name = info.get("name") or ""
-        last_topic = info.get("last_topic")
-        personality = info.get("personality", "Wuen")
+FOLLOWUP_CONCURRENCY = 10
+FOLLOWUP_SEND_RETRIES = 3
+FOLLOWUP_SHUTDOWN_TIMEOUT = 20  # segundos de espera a envíos en curso al apagar
+
+async def _send_followup(application: Application, sem: asyncio.Semaphore, uid: str, info: UserRec, now: datetime, today_str: str):
+    async with sem:
+        name = info.name or ""
+        last_topic = info.last_topic
+        personality = info.personality
         user_msg = (
             f"🌼 Hola {name}, recordando que hablaste sobre: {last_topic}. ¿Cómo te fue desde entonces?"
             if last_topic else f"🌸 Hola {name}, ¿cómo te sientes hoy?"
         )
-        reply_text = await openrouter_chat(uid, user_msg, personality, last_topic, info.get("history", []))
+        reply_text = await openrouter_chat(uid, user_msg, personality, last_topic, info.history, max_tokens=SHORT_REPLY_MAX_TOKENS)
         try:
-            await application.bot.send_message(chat_id=int(uid), text=reply_text)
-            users[uid]["last_sent_date"] = today_str
-            users[uid]["last_sent_time"] = now.isoformat()
-            users[uid].setdefault("history", []).append({"role": "assistant", "content": reply_text})
-            users[uid]["history"] = users[uid]["history"][-30:]
-            await save_users(users)
+            for attempt in range(FOLLOWUP_SEND_RETRIES):
+                try:
+                    await application.bot.send_message(chat_id=int(uid), text=reply_text)
+                    break
+                except RetryAfter as e:
+                    if attempt == FOLLOWUP_SEND_RETRIES - 1:
+                        raise
+                    logger.warning("Rate limit enviando a %s, reintento en %ss", uid, e.retry_after)
+                    await asyncio.sleep(e.retry_after)
+            info.last_sent_date = today_str
+            info.last_sent_time = now.isoformat()
+            info.history.append({"role": "assistant", "content": reply_text})
             logger.info("Sent follow-up to %s (%s)", uid, name)
+            return True
         except Exception as e:
             logger.exception("Failed to send follow-up to %s: %s", uid, e)
+            return False
+
+async def send_followups(application: Application, target_hour: int = None):
+    now = datetime.now(LOCAL_TZ)
+    candidates = TIMESLOT_INDEX.get(now.hour if target_hour is None else target_hour)
+    if not candidates:
+        return
+    today_str = date.today().isoformat()
+    due = []
+    for uid in candidates:
+        info = USERS.get(uid)
+        if not info or info.last_sent_date == today_str:
+            continue
+        due.append((uid, info))
+
+    sem = asyncio.Semaphore(FOLLOWUP_CONCURRENCY)
+    tasks = [asyncio.create_task(_send_followup(application, sem, uid, info, now, today_str)) for uid, info in due]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        # También si se cancela al apagar: los ya enviados quedan marcados.
+        for (uid, _), task in zip(due, tasks):
+            if task.done() and not task.cancelled() and task.result():
+                mark_dirty(uid)
+
+def start_followups(application: Application, target_hour: int = None):
+    """Lanza send_followups como tarea registrada para que post_shutdown la espere."""
+    task = asyncio.create_task(send_followups(application, target_hour))
+    running = application.bot_data.setdefault("followup_tasks", set())
+    running.add(task)
+    task.add_done_callback(running.discard)
+    return task
+
+async def run_followups(application: Application, target_hour: int = None):
+    await start_followups(application, target_hour)
 
 # -------------------- Main --------------------
-async def main():
-    app = ApplicationBuilder().token(TELEGRAM_TOKEN).build()
+async def post_init(application: Application):
+    global OPENROUTER_CLIENT
+    await init_db()
+    if OPENROUTER_CLIENT is None:
+        OPENROUTER_CLIENT = create_openrouter_client()
+    application.bot_data["users_flush_task"] = asyncio.create_task(users_flush_loop())
+    application.bot_data["scheduler"].start()
+    # El cron solo dispara a las hh:00: si se arranca dentro de una franja, se
+    # envía ahora (last_sent_date evita duplicados).
+    hour = datetime.now(LOCAL_TZ).hour
+    if hour in TIMESLOT_HOUR.values():
+        start_followups(application, hour)
+
+async def post_shutdown(application: Application):
+    global OPENROUTER_CLIENT
+    scheduler = application.bot_data.get("scheduler")
+    if scheduler and scheduler.running:
+        scheduler.shutdown(wait=False)
+    followups = application.bot_data.get("followup_tasks")
+    if followups:
+        _, pending = await asyncio.wait(set(followups), timeout=FOLLOWUP_SHUTDOWN_TIMEOUT)
+        for t in pending:
+            t.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+    task = application.bot_data.pop("users_flush_task", None)
+    if task:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    await flush_users()
+    await close_db()
+    if OPENROUTER_CLIENT is not None:
+        await OPENROUTER_CLIENT.aclose()
+        OPENROUTER_CLIENT = None
+
+def main():
+    app = (
+        ApplicationBuilder()
+        .token(TELEGRAM_TOKEN)
+        # Pools separados: el long-polling de getUpdates no compite con send_message.
+        .connection_pool_size(32)
+        .pool_timeout(20)
+        .get_updates_connection_pool_size(4)
+        .get_updates_pool_timeout(60)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
     conv = ConversationHandler(
         entry_points=[CommandHandler("start", start)],
         states={
-            REGISTER_NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, register_name)],
-            REGISTER_TIME: [MessageHandler(filters.TEXT & ~filters.COMMAND, register_time)],
-            REGISTER_PERSONALITY: [MessageHandler(filters.TEXT & ~filters.COMMAND, register_personality)],
+            REGISTER_NAME: [MessageHandler(TEXT_FILTER, register_name)],
+            REGISTER_TIME: [MessageHandler(TEXT_FILTER, register_time)],
+            REGISTER_PERSONALITY: [MessageHandler(TEXT_FILTER, register_personality)],
         },
         fallbacks=[CommandHandler("ayuda", ayuda)],
     )
     app.add_handler(conv)
     app.add_handler(CommandHandler("perfil", perfil))
     app.add_handler(CommandHandler("ayuda", ayuda))
-    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+    app.add_handler(MessageHandler(TEXT_FILTER, handle_message))
 
     scheduler = AsyncIOScheduler(timezone=LOCAL_TZ)
-    scheduler.add_job(lambda: asyncio.create_task(send_followups(app)), IntervalTrigger(minutes=10))
-    scheduler.start()
+    for hour in sorted(set(TIMESLOT_HOUR.values())):
+        scheduler.add_job(
+            run_followups,
+            CronTrigger(hour=hour, minute=0, timezone=LOCAL_TZ),
+            kwargs={"application": app, "target_hour": hour},
+            misfire_grace_time=50 * 60,
+            coalesce=True,
+        )
+    # Se arranca en post_init, ya dentro del loop de run_polling.
+    app.bot_data["scheduler"] = scheduler
 
     logger.info("🤖 Bot iniciado en Railway. Ejecutando polling...")
-    await app.run_polling()
+    app.run_polling()
+    logger.info("Saliendo...")
 
 if __name__ == "__main__":
-    import nest_asyncio
-    nest_asyncio.apply()
-    try:
-        asyncio.get_event_loop().run_until_complete(main())
-    except (KeyboardInterrupt, SystemExit):
-        logger.info("Saliendo...")
+    main()